@@ -1,4 +1,5 @@
-from typing import List
+import os
+from typing import List, Iterable, Sequence
 
 
 class CNF:
@@ -70,6 +71,8 @@ class DIMACS_CNF(CNF):
     """
 
     DIMACS_HEADER_COMMENT = "Generated by exact_cover_sat, made by Samuel Bartík" # Set to None to optionally disable
+    # Approximate number of bytes of formatted clauses collected before they are written to the file
+    WRITE_CHUNK_SIZE = 1 << 20
 
     def __init__(self, clauses: List[List[int]], variable_count: int):
         super().__init__(clauses, variable_count)
@@ -80,17 +83,56 @@ class DIMACS_CNF(CNF):
 
         :exception Exception: If an error occurs while saving the CNF to a file
         """
+        self.stream_to_file(filepath, self.clauses, self.variable_count, len(self.clauses))
+
+    @classmethod
+    def stream_to_file(cls, filepath: str, clauses: Iterable[Sequence[int]], variable_count: int, clause_count: int) -> None:
+        """
+        Writes CNF clauses to a specified file in DIMACS format as they come, without keeping them all in memory.
+
+        NOTE: Clauses are formatted and joined into chunks of roughly WRITE_CHUNK_SIZE bytes, each written by a single os.write call.
+
+        :param filepath: Path to the file the clauses are written to
+        :param clauses: Clauses made of normalized variables, may be a generator
+        :param variable_count: Number of variables stated in the header
+        :param clause_count: Number of clauses stated in the header, the clauses have to match it exactly
+        :exception Exception: If an error occurs while saving the CNF to a file or the number of clauses does not match the header
+        """
         try:
-            with open(filepath, 'w') as f:
-                if self.DIMACS_HEADER_COMMENT is not None: f.write(f"c {self.DIMACS_HEADER_COMMENT}\n") # Optionally add a comment
-                # First, output a header
-                f.write(f"p cnf {self.variable_count} {len(self.clauses)}\n")
-                # Then individual clauses
-                for clause in self.clauses:
-                    f.write(f"{' '.join(map(str, clause))} 0\n")
+            fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                header = f"p cnf {variable_count} {clause_count}\n"
+                if cls.DIMACS_HEADER_COMMENT is not None: header = f"c {cls.DIMACS_HEADER_COMMENT}\n" + header # Optionally add a comment
+                cls._write_all(fd, header.encode('utf-8'))
+
+                written_clause_count = 0
+                chunk = []
+                chunk_size = 0
+                for clause in clauses:
+                    clause_line = f"{' '.join(map(str, clause))} 0\n"
+                    chunk.append(clause_line)
+                    chunk_size += len(clause_line)
+                    written_clause_count += 1
+                    if chunk_size >= cls.WRITE_CHUNK_SIZE:
+                        cls._write_all(fd, "".join(chunk).encode('utf-8'))
+                        chunk.clear()
+                        chunk_size = 0
+                cls._write_all(fd, "".join(chunk).encode('utf-8'))
+
+                if written_clause_count != clause_count:
+                    raise Exception(f"the header states {clause_count} clauses, but {written_clause_count} were written")
+            finally:
+                os.close(fd)
         except Exception as e:
             raise Exception(f"Failed to save CNF to {filepath}: {e}")
 
+    @staticmethod
+    def _write_all(fd: int, data: bytes) -> None:
+        """ Writes all the data to the file descriptor, as os.write may write only a part of it """
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
     def convert_back_to_denormalized_cnf(self, translator: VariableTranslator) -> CNF:
         """
         Converts a normalized CNF formula into a CNF formula based on the provided variable translator converting from normalized variables to our definition of variables.
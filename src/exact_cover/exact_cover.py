@@ -1,7 +1,9 @@
+from collections import defaultdict
 from itertools import combinations
-from typing import Tuple, List, Dict
+from pathlib import Path
+from typing import Tuple, List, Dict, Iterator, Sequence
 
-from exact_cover_sat.cnf import DIMACS_CNF, VariableTranslator
+from exact_cover_sat.cnf import DIMACS_CNF
 from exact_cover_sat.glucose import GlucoseSAT
 
 
@@ -30,63 +32,151 @@ class ExactCoverSolver:
     """
     Given the ExactCoverProblem, it reduces the problem to a SAT problem that it will then solve via a SAT solver.
     """
+
+    # Up to this many literals the pairwise "at most one" encoding is used, above it the sequential one
+    PAIRWISE_AMO_MAX_LITERALS = 3
+
     def __init__(self, problem: ExactCoverProblem):
         self.problem = problem
 
-    def _encode_to_dimacs_cnf(self) -> Tuple[DIMACS_CNF, VariableTranslator]:
+    def _get_distinct_subset_indices(self) -> List[List[int]]:
         """
-        Encodes the problem to a DIMACS CNF format, together with a translation dictionary. For formal specifics check out README.md.
+        Returns the lists of indices of subsets containing an element, for each element of the universum, but every distinct list only once.
 
-        NOTE: Encode the problem to a DIMACS compatible CNF format. Formally, we have defined our atomic variables (propositions) as p_i is TRUE <=> S_i ∈ S*.
-        We would have almost a DIMACS compatible CNF format if we renamed each our literal p_i to i and ¬p_i to -i. However, the problem is that DIMACS needs all the
-        variables used in clauses to be in the 1,...,n range. But in our case it could occur that we construct a CNF statement that for the sake of simplicity contains a single clause with literals p_1, ¬p_4, p_2.
-        The statement contains 3 distinct variables. We would have translated it to: 1, -4, 2. The problem is that the DIMACS format requires for us to explicitly state the numbers of distinct variables "n" at the start and
-        then each of the clause can contain only variables 1,...,n.
+        NOTE: Elements that are contained in exactly the same subsets get exactly the same S1 and S2 clauses, so it is enough to encode just one of them.
+        """
+        distinct_subset_indices = {}
+        for x in self.problem.universum:
+            subset_indices_with_x = self.problem.get_subset_indices_containing_element(x)
+            distinct_subset_indices.setdefault(tuple(subset_indices_with_x), subset_indices_with_x)
+        return list(distinct_subset_indices.values())
 
-        So I decided to translate back and forth between "our variables" as defined above (just reduced to numbers: kept only the i in p_i variable) and "normalized" variables in the required 1,...,n range.
+    def _get_unconstrained_subset_indices(self, distinct_subset_indices: List[List[int]]) -> List[int]:
+        """
+        Returns the indices of subsets that contain no element of the universum, so neither S1 nor S2 clauses mention them.
 
-        :return: A tuple of DIMACS CNF format and a Translator that can translate variables back and forth: normalized variable <-> our variable
+        :param distinct_subset_indices: Lists of indices of subsets containing an element, as returned by self._get_distinct_subset_indices()
         """
-        clauses = []
-        translator = VariableTranslator()
+        constrained_subset_indices = set()
+        for subset_indices_with_x in distinct_subset_indices:
+            constrained_subset_indices.update(subset_indices_with_x)
+        return [subset_index for subset_index in range(len(self.problem.collection)) if subset_index not in constrained_subset_indices]
 
-        for x in self.problem.universum:
-            subset_indices_with_x = self.problem.get_subset_indices_containing_element(x) # { i | x \in S_i }
+    def _get_formula_size(self, distinct_subset_indices: List[List[int]], unconstrained_subset_indices: List[int]) -> Tuple[int, int]:
+        """
+        Computes the size of the encoded formula in closed form from the number of subsets containing each element, without generating it.
+
+        NOTE: Every element with k subsets containing it gets 1 clause for S1 and either k(k-1)/2 pairwise clauses or 3k - 4 clauses
+        and k - 1 auxiliary variables of the sequential encoding for S2. Every subset not containing any element gets a single clause.
+
+        :param distinct_subset_indices: Lists of indices of subsets containing an element, as returned by self._get_distinct_subset_indices()
+        :param unconstrained_subset_indices: Indices of subsets containing no element, as returned by self._get_unconstrained_subset_indices()
+        :return: A tuple of the number of variables and the number of clauses generated by self._generate_clauses()
+        """
+        variable_count = len(self.problem.collection)
+        clause_count = len(unconstrained_subset_indices)
+        for subset_indices_with_x in distinct_subset_indices:
+            k = len(subset_indices_with_x)
+            if k <= self.PAIRWISE_AMO_MAX_LITERALS:
+                clause_count += 1 + k * (k - 1) // 2
+            else:
+                variable_count += k - 1
+                clause_count += 1 + 3 * k - 4
+        return variable_count, clause_count
+
+    def _generate_clauses(self, distinct_subset_indices: List[List[int]], unconstrained_subset_indices: List[int]) -> Iterator[Sequence[int]]:
+        """
+        Lazily generates the clauses of the problem encoded in a DIMACS compatible CNF format. For formal specifics check out README.md.
+
+        NOTE: Encode the problem to a DIMACS compatible CNF format. Formally, we have defined our atomic variables (propositions) as p_i is TRUE <=> S_i ∈ S*.
+        DIMACS needs all the variables used in clauses to be in the 1,...,n range, where n is stated explicitly at the start. Since i is an index into
+        self.collection, it is in the 0,...,l-1 range, so the variable p_i is simply normalized to i+1 and ¬p_i to -(i+1). The auxiliary variables of the
+        sequential encoding are numbered contiguously right after them, starting from l+1.
 
+        Subsets that contain no element of the universum would be left unconstrained, so they are explicitly excluded from S* by a clause (NOT p_i).
+
+        :param distinct_subset_indices: Lists of indices of subsets containing an element, as returned by self._get_distinct_subset_indices()
+        :param unconstrained_subset_indices: Indices of subsets containing no element, as returned by self._get_unconstrained_subset_indices()
+        :return: Generator of clauses made of normalized variables, its size is computed by self._get_formula_size()
+        """
+        pairwise_amo_max_literals = self.PAIRWISE_AMO_MAX_LITERALS
+        next_aux_var = len(self.problem.collection) + 1
+
+        for subset_indices_with_x in distinct_subset_indices: # { i | x \in S_i } for some x
             # S1: Just take all subset indices a,b,c,... that contain the element x, constructing a single CNF clause: (p_a OR p_b OR p_c OR ...)
-            s1_clause = [translator.get_normalized_var(our_variable_number) for our_variable_number in subset_indices_with_x]
-            clauses.append(s1_clause)
+            s1_clause = [subset_index + 1 for subset_index in subset_indices_with_x]
+            yield s1_clause
+
+            # S2: For a few subsets, take combinations of negated subset variables ¬p_i,¬p_j that contain the element x. Each such pair is a CNF clause: (NOT p_i OR NOT p_j)
+            if len(s1_clause) <= pairwise_amo_max_literals:
+                yield from combinations([-literal for literal in s1_clause], 2)
+            # Otherwise the number of pairs would grow quadratically, so we use the sequential encoding that is linear in size
+            else:
+                yield from self._encode_at_most_one_sequential(s1_clause, next_aux_var)
+                next_aux_var += len(s1_clause) - 1
+
+        for subset_index in unconstrained_subset_indices:
+            yield [-(subset_index + 1)]
+
+    def _stream_encode(self, filepath: str) -> None:
+        """
+        Encodes the problem and writes it to a DIMACS CNF file as the clauses are generated, without keeping them all in memory.
 
-            # S2: Iterate over combinations of subset indices i,j that contain the element x. For such a pair we construct a CNF clause: (NOT p_i OR NOT p_j)
-            for i,j in combinations(range(len(subset_indices_with_x)), 2):
-                normalized_var_translation_i = translator.get_normalized_var(subset_indices_with_x[i])
-                normalized_var_translation_j = translator.get_normalized_var(subset_indices_with_x[j])
-                clauses.append([-normalized_var_translation_i, -normalized_var_translation_j]) # corresponds to (NOT p_i OR NOT p_j)
+        NOTE: The header has to state the number of variables and clauses before the clauses themselves, so they are computed in closed form up front.
+
+        :param filepath: Path to the file the DIMACS CNF formula is written to
+        :exception Exception: If an error occurs while saving the CNF to a file
+        """
+        distinct_subset_indices = self._get_distinct_subset_indices()
+        unconstrained_subset_indices = self._get_unconstrained_subset_indices(distinct_subset_indices)
+        variable_count, clause_count = self._get_formula_size(distinct_subset_indices, unconstrained_subset_indices)
+        clauses = self._generate_clauses(distinct_subset_indices, unconstrained_subset_indices)
+        DIMACS_CNF.stream_to_file(filepath, clauses, variable_count, clause_count)
+
+    @staticmethod
+    def _encode_at_most_one_sequential(literals: List[int], first_aux_var: int) -> List[Tuple[int, int]]:
+        """
+        Encodes that at most one of the literals is true via the sequential counter encoding (C. Sinz, 2005).
+
+        NOTE: For literals l_1, ..., l_k we introduce auxiliary variables a_1, ..., a_{k-1}, where a_i is forced to be true
+        whenever any of l_1, ..., l_i is true. Then l_i must be false whenever a_{i-1} is true. It takes 3k - 4 clauses
+        and k - 1 auxiliary variables instead of the k(k-1)/2 clauses of the pairwise encoding.
+        Each group of clauses is zipped from shifted sequences of literals, so no clause is built element by element.
+
+        :param literals: Normalized literals out of which at most one can be true, there has to be at least 2 of them
+        :param first_aux_var: The first of k - 1 consecutive unused normalized variables, used as the auxiliary variables
+        :return: CNF clauses of the encoding
+        """
+        negated_literals = [-literal for literal in literals]
+        aux_vars = range(first_aux_var, first_aux_var + len(literals) - 1)
+        negated_aux_vars = range(-first_aux_var, -first_aux_var - len(literals) + 1, -1)
 
-        return DIMACS_CNF(clauses, translator.get_var_count()), translator
+        clauses = list(zip(negated_literals, aux_vars))              # l_i -> a_i, for i < k
+        clauses.extend(zip(negated_aux_vars, aux_vars[1:]))          # a_{i-1} -> a_i
+        clauses.extend(zip(negated_literals[1:], negated_aux_vars))  # a_{i-1} -> NOT l_i, for i > 1
+        return clauses
 
-    def _decode_model(self, model: List[int], translator: VariableTranslator) -> List[int]:
+    def _decode_model(self, model: Sequence[int]) -> List[int]:
         """
         Decodes the SAT model into a solution of our problem.
 
         :param model: A model returned from a SAT solver on a normalized DIMACS CNF formula
-        :param translator: Translator that translates from the 1...n SAT solver atomic variables (proposition) to our definition of variables
         :return: Indices of the self.collection set to choose in order to satisfy the exact cover problem
         """
 
-        # Skip negative variables as they correspond to "NOT" choosing a subset from the collection
-        collection_indices = [ translator.get_our_var(glucose_var) for glucose_var in model if glucose_var > 0 ]
+        # Skip negative variables as they correspond to "NOT" choosing a subset from the collection, and auxiliary variables that are above the subsets
+        subset_count = len(self.problem.collection)
+        collection_indices = [ glucose_var - 1 for glucose_var in model if 0 < glucose_var <= subset_count ]
         return collection_indices
 
 
     def solve(self, solver: GlucoseSAT, cnf_output_file: str, solver_verbosity: int = GlucoseSAT.VERBOSE_LEVEL_LOW) -> List[int] | None:
         """ Solves the problem using the passed SAT solver """
-        dimacs_cnf, var_translator = self._encode_to_dimacs_cnf()
-        dimacs_cnf.save_to_file(cnf_output_file)
+        self._stream_encode(cnf_output_file)
 
         result = solver.run_from_file(cnf_output_file, solver_verbosity, get_model=True)
 
-        return self._decode_model(result.model, var_translator) if result.satisfied else None
+        return self._decode_model(result.model) if result.satisfied else None
 
 def load_problem_from_file(filepath: str) -> ExactCoverProblem:
     """
@@ -94,24 +184,19 @@ def load_problem_from_file(filepath: str) -> ExactCoverProblem:
     :param filepath: Path to the input problem file
     :return: ExactCoverProblem instance
     """
-    universum = []
-    subsets = []
-    lookup_dict = {}
     try:
-        with open(filepath, 'r') as f:
-            header_line = f.readline()
-            universum = header_line.split()
-
-            subset_index = 0
-            for line in f:
-                subset = line.split()
-                for subset_element in subset:
-                    if subset_element in lookup_dict:
-                        lookup_dict[subset_element].append(subset_index)
-                    else:
-                        lookup_dict[subset_element] = [subset_index]
-                subsets.append(subset)
-                subset_index += 1
+        # Split only on newlines (str.splitlines would also split on e.g. \f or \x1c), just like iterating over the file does
+        lines = Path(filepath).read_text().split('\n')
+        if lines[-1] == "": lines.pop() # The file ends with a newline
+
+        universum = lines[0].split() if lines else []
+        subsets = []
+        lookup_dict = defaultdict(list)
+        for subset_index, line in enumerate(lines[1:]):
+            subset = line.split()
+            for subset_element in subset:
+                lookup_dict[subset_element].append(subset_index)
+            subsets.append(subset)
 
         return ExactCoverProblem(universum, subsets, lookup_dict)
     except:
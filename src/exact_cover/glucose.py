@@ -1,4 +1,6 @@
+import re
 import subprocess
+from array import array
 from dataclasses import dataclass
 from typing import Optional, List
 
@@ -6,7 +8,7 @@ from typing import Optional, List
 @dataclass
 class GlucoseSATResponse:
     satisfied: bool = False
-    model: Optional[List[int]] = None
+    model: Optional[array] = None # Signed 64-bit integers ('q'), one literal per variable without the terminating 0
 
 class GlucoseSAT:
     """ Interface for the Glucose SAT solver """
@@ -16,6 +18,13 @@ class GlucoseSAT:
     VERBOSE_LEVEL_MID = 1
     VERBOSE_LEVEL_MAX = 2
 
+    # Exit codes of the solver process that state the satisfiability, as usual for MiniSat based solvers
+    EXIT_CODE_SATISFIABLE = 10
+    EXIT_CODE_UNSATISFIABLE = 20
+
+    # Matches the output lines we care about: group 1 is the satisfiability answer, group 2 a part of the model
+    OUTPUT_LINE_PATTERN = re.compile(r"s (SATISFIABLE|UNSATISFIABLE)|v (.*)")
+
     def __init__(self, exec_path: str):
         self._exec_path = exec_path
 
@@ -33,24 +42,52 @@ class GlucoseSAT:
         glucose_args.append(f"-verb={verbosity_level if verbosity_level is not None else self.VERBOSE_LEVEL_LOW}")
         glucose_args.append(filepath)
 
+        # Nothing would be read from the output, so the satisfiability is taken from the exit code alone
+        if not get_model and verbosity_level is None:
+            return self._run_for_exit_code(glucose_args)
+
         try:
-            process_result = subprocess.run(glucose_args, stdout=subprocess.PIPE)
+            process = subprocess.Popen(glucose_args, stdout=subprocess.PIPE, bufsize=1, encoding='utf-8')
         except:
             raise Exception(f"Failed to execute Glucose SAT solver.")
 
+        # Output is processed line by line as it arrives, so only the model is kept in memory, not the whole log
         model = None
         satisfied = None
-        for line in process_result.stdout.decode('utf-8').split('\n'):
-            if get_model and line.startswith("v"):
-                model = list(map(int, line[1:-1].strip().split(" "))) # Gets rid of first and last char and then parses ints inbetween
-            if line.startswith("s SATISFIABLE"):
-                satisfied = True
-            if line.startswith("s UNSATISFIABLE"):
-                satisfied = False
+        with process:
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                match = self.OUTPUT_LINE_PATTERN.match(line)
+                if match is not None:
+                    if match.lastindex == 1:
+                        satisfied = match.group(1) == "SATISFIABLE"
+                    elif get_model:
+                        if model is None: model = array('q')
+                        model.extend(map(int, match.group(2).split())) # Glucose may split the model across multiple "v" lines
 
-            if verbosity_level is not None: print(line)
+                if verbosity_level is not None: print(line)
 
         if satisfied is None:
-            raise Exception("Unable to to discover satisfiability from the glucose process output.")
+            raise Exception(f"Unable to to discover satisfiability from the glucose process output (exit code {process.returncode}).")
+
+        if model and model[-1] == 0: model.pop() # The model is terminated by 0, which is not a literal
 
         return GlucoseSATResponse(satisfied=satisfied, model=model)
+
+    def _run_for_exit_code(self, glucose_args: List[str]) -> GlucoseSATResponse:
+        """
+        Runs the Glucose SAT solver with its output discarded and determines the satisfiability from its exit code
+        :param glucose_args: The whole command line of the solver process
+        :return: A glucose response object without a model
+        :exception Exception: In case the exit code does not state satisfiability or when glucose failed to execute.
+        """
+        try:
+            process_result = subprocess.run(glucose_args, stdout=subprocess.DEVNULL)
+        except:
+            raise Exception(f"Failed to execute Glucose SAT solver.")
+
+        if process_result.returncode == self.EXIT_CODE_SATISFIABLE:
+            return GlucoseSATResponse(satisfied=True)
+        if process_result.returncode == self.EXIT_CODE_UNSATISFIABLE:
+            return GlucoseSATResponse(satisfied=False)
+        raise Exception(f"Unable to to discover satisfiability from the glucose process exit code {process_result.returncode}.")